@@ -17,16 +17,52 @@ ONLY_BROWSER   = "ANY"      # "ANY" or an exact browser label that appears in yo
 FAIL_STREAK    = 3          # minutes in a row to call it an incident
 TREAT_MISSING  = False      # True = missing minutes count as failures
 SLO_TARGET     = "auto"     # "auto" or a number like "99.900"
+
+# PDF handoff (invoke the html->pdf Lambda directly with the HTML in the event)
+PDF_LAMBDA_ARN     = ""         # "" = off: only write uptime-report.html to REPORTS_BUCKET (as before)
+HANDOFF_INLINE_MAX = 5_500_000  # max inline event size in bytes (sync invoke limit is 6 MB); larger reports go via S3
+
+# Response-time sampling (summarize_month_from_artifacts_quick)
+SAMPLE_BATCH       = 16         # SyntheticsReport JSONs fetched in parallel per round
+SAMPLE_MIN         = 32         # never stop with fewer durations than this
+SAMPLE_REL_TOL     = 0.05       # stop once the CI half-width is within 5% of the mean
+SAMPLE_Z           = 1.96       # 95% confidence
+
+# Response-time quantile sketches (uptime-sketches.json)
+SKETCH_ALPHA       = 0.01       # relative accuracy of any quantile (1%)
+SKETCH_MAX_BINS    = 1024       # hard cap on buckets per sketch (lowest buckets collapse first)
+
+# Backfill (backfill_handler)
+BACKFILL_WORKERS   = 4          # months scanned concurrently
+
+# Report upload (write_stream)
+UPLOAD_PART_SIZE   = 8 * 1024 * 1024  # single put_object below this, multipart parts of this size above
+
+# Compaction (compact_handler): one gzip bundle + index per completed day under ART_PREFIX/_bundles/
+COMPACT_WORKERS    = 16         # parallel GETs while building a bundle
+COMPACT_DELETE_ORIGINALS = False  # True = delete the raw artifacts once bundle and index are written
+BUNDLE_REPARSE     = False      # True = re-run the parsers on bundled payloads (1 GET per day) instead of trusting the index
+
+# Profiling (opt-in per event: {"profile": true} or {"profile": "s3://bucket/prefix" | "/local/dir"};
+# only s3:// or absolute paths are destinations, other strings are flags: true/1/yes/on, anything else off)
+PROFILE_OUTPUT     = ""         # "" = only when the event asks; a destination or flag = profile every run
+PROFILE_TOP_N      = 30         # hot functions listed in the text summary
 # ===================================================================
 
-import os, json, re, csv, io, datetime, random
+import os, json, re, csv, io, datetime, random, time, math, functools, cProfile, pstats, gzip, tempfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timezone, timedelta
 from string import Template
-from typing import Optional, List, Dict, Any, Tuple
+from typing import Optional, List, Dict, Any, Tuple, Iterator
 from statistics import median
 import boto3
+from botocore.config import Config
 
-s3 = boto3.client("s3")
+s3 = boto3.client("s3", config=Config(max_pool_connections=32))  # shared across worker threads
+lam = boto3.client("lambda", config=Config(read_timeout=900, retries={"max_attempts": 0}))
+# One pool for every sampling round, so concurrent months (backfill) share SAMPLE_BATCH GETs
+# instead of each opening its own; keeps fetches well under the s3 client's 32 connections.
+sample_pool = ThreadPoolExecutor(max_workers=SAMPLE_BATCH)
 
 def log(m: str) -> None:
     print(m, flush=True)
@@ -116,6 +152,148 @@ def parse_har_html(html: str):
     dur_ms = sum(times)/len(times) if times else 0.0
     return status, dur_ms
 
+def artifact_type(fname: str) -> str:
+    name = fname.lower()
+    if is_synthetics_json(fname): return "synthetics"
+    if name.endswith("-log.txt"): return "log"
+    if name == "httprequestsreport.json": return "httprequests"
+    if name.endswith("results.har.html"): return "har"
+    return "other"
+
+def parse_artifact(fname: str, body: bytes) -> Tuple[Optional[bool], float]:
+    """(success, duration_ms) for one artifact; (None, 0.0) for file types no parser handles.
+    Malformed payloads raise."""
+    kind = artifact_type(fname); succ=None; ms=0.0
+    if kind == "synthetics":
+        succ, ms = parse_synthetics_json(json.loads(body.decode("utf-8",errors="ignore")), fname)
+    elif kind == "log":
+        succ, ms = parse_log_text(body.decode("utf-8",errors="ignore"))
+    elif kind == "httprequests":
+        data=json.loads(body.decode("utf-8",errors="ignore"))
+        codes=[(r.get("response") or {}).get("statusCode") for r in (data.get("requests") or [])]
+        codes=[c for c in codes if isinstance(c,int)]
+        succ = False if any(c>=400 for c in codes) else True
+    elif kind == "har":
+        succ, ms = parse_har_html(body.decode("utf-8",errors="ignore"))
+    return succ, ms
+
+# ---------------------- Quantile sketches ---------------------------
+class DDSketch:
+    """Mergeable quantile sketch (DDSketch): log-spaced buckets give quantiles within SKETCH_ALPHA
+    relative error; at most SKETCH_MAX_BINS buckets, so size and merge cost are bounded."""
+    __slots__ = ("alpha", "gamma", "_lg", "max_bins", "bins", "zero", "count", "sum", "min", "max")
+
+    def __init__(self, alpha: float = SKETCH_ALPHA, max_bins: int = SKETCH_MAX_BINS):
+        self.alpha = alpha; self.gamma = (1 + alpha) / (1 - alpha); self._lg = math.log(self.gamma)
+        self.max_bins = max_bins
+        self.bins: Dict[int, int] = {}
+        self.zero = 0; self.count = 0; self.sum = 0.0
+        self.min: Optional[float] = None; self.max: Optional[float] = None
+
+    @classmethod
+    def of(cls, values) -> "DDSketch":
+        sk = cls()
+        for v in values: sk.add(v)
+        return sk
+
+    def add(self, v: float, n: int = 1) -> None:
+        v = float(v)
+        if v <= 0.0: self.zero += n
+        else:
+            k = math.ceil(math.log(v) / self._lg)
+            self.bins[k] = self.bins.get(k, 0) + n
+            if len(self.bins) > self.max_bins: self._collapse()
+        self.count += n; self.sum += v * n
+        self.min = v if self.min is None else min(self.min, v)
+        self.max = v if self.max is None else max(self.max, v)
+
+    def _collapse(self) -> None:
+        keys = sorted(self.bins)
+        extra = keys[:len(keys) - self.max_bins]
+        into = keys[len(extra)]
+        self.bins[into] += sum(self.bins.pop(k) for k in extra)
+
+    def merge(self, other: "DDSketch") -> "DDSketch":
+        if other.alpha != self.alpha: raise ValueError(f"cannot merge sketches with alpha {self.alpha} and {other.alpha}")
+        for k, c in other.bins.items(): self.bins[k] = self.bins.get(k, 0) + c
+        if len(self.bins) > self.max_bins: self._collapse()
+        self.zero += other.zero; self.count += other.count; self.sum += other.sum
+        for v in (other.min, other.max):
+            if v is None: continue
+            self.min = v if self.min is None else min(self.min, v)
+            self.max = v if self.max is None else max(self.max, v)
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count: return None
+        rank = q * (self.count - 1)
+        seen = self.zero
+        if rank < seen: return 0.0
+        for k in sorted(self.bins):
+            seen += self.bins[k]
+            if rank < seen:
+                v = 2.0 * self.gamma ** k / (self.gamma + 1.0)
+                return min(max(v, self.min), self.max)
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"n": self.count, "sum": round(self.sum, 3), "min": self.min, "max": self.max, "zero": self.zero,
+                "bins": [[k, self.bins[k]] for k in sorted(self.bins)]}
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any], alpha: float = SKETCH_ALPHA) -> "DDSketch":
+        sk = cls(alpha)
+        sk.bins = {int(k): int(c) for k, c in d.get("bins", [])}
+        sk.zero = int(d.get("zero", 0)); sk.count = int(d.get("n", 0)); sk.sum = float(d.get("sum", 0.0))
+        sk.min = d.get("min"); sk.max = d.get("max")
+        return sk
+
+def rollup_sketches(per_min: Dict[datetime.datetime, DDSketch], bucket) -> Dict[Any, DDSketch]:
+    """Merge minute sketches into buckets keyed by bucket(minute), e.g. the hour or the date."""
+    out: Dict[Any, DDSketch] = {}
+    for t in sorted(per_min):
+        b = bucket(t)
+        out.setdefault(b, DDSketch(per_min[t].alpha)).merge(per_min[t])
+    return out
+
+def sketch_rollups(per_min: Dict[datetime.datetime, DDSketch]):
+    """Hour, day and month rollups of the minute sketches."""
+    hours = rollup_sketches(per_min, lambda t: t.replace(minute=0, second=0, microsecond=0))
+    days = rollup_sketches(per_min, lambda t: t.date())
+    month = DDSketch()
+    for sk in days.values(): month.merge(sk)
+    return hours, days, month
+
+def sketches_doc(hours: Dict[datetime.datetime, DDSketch], days: Dict[datetime.date, DDSketch], month: DDSketch) -> Dict[str, Any]:
+    """Serialized form of sketch_rollups() (durations in ms); minute sketches are not persisted."""
+    return {
+        "unit": "ms", "alpha": SKETCH_ALPHA, "max_bins": SKETCH_MAX_BINS,
+        "hours": {h.strftime("%Y-%m-%d %H:%M"): sk.to_dict() for h, sk in hours.items()},
+        "days": {d.strftime("%Y-%m-%d"): sk.to_dict() for d, sk in days.items()},
+        "month": month.to_dict(),
+    }
+
+def load_sketches(y: int, mo: int) -> Optional[Dict[str, Any]]:
+    try:
+        body = s3.get_object(Bucket=REPORTS_BUCKET, Key=f"{REPORTS_PREFIX}/{y}/{mo:02d}/uptime-sketches.json")["Body"].read()
+        return json.loads(body.decode("utf-8"))
+    except Exception:
+        return None
+
+def window_quantiles(start: datetime.datetime, end: datetime.datetime, qs=(0.5, 0.95, 0.99)) -> Dict[float, Optional[float]]:
+    """Response-time quantiles (ms) for [start, end] at hour granularity, merged from stored sketches."""
+    merged = DDSketch()
+    y, mo = start.year, start.month
+    while (y, mo) <= (end.year, end.month):
+        doc = load_sketches(y, mo)
+        if doc:
+            for h, d in doc.get("hours", {}).items():
+                ht = datetime.datetime.strptime(h, "%Y-%m-%d %H:%M").replace(tzinfo=timezone.utc)
+                if start.replace(minute=0, second=0, microsecond=0) <= ht <= end:
+                    merged.merge(DDSketch.from_dict(d, doc.get("alpha", SKETCH_ALPHA)))
+        y, mo = (y+1, 1) if mo == 12 else (y, mo+1)
+    return {q: merged.quantile(q) for q in qs}
+
 # ---------------------- Artifact Scanning ---------------------------
 def _list_prefix(prefix: str):
     pag = s3.get_paginator("list_objects_v2")
@@ -123,22 +301,52 @@ def _list_prefix(prefix: str):
         for obj in page.get("Contents", []):
             yield obj["Key"]
 
+def _match_key(key: str, start: datetime.datetime, end: datetime.datetime):
+    m = PAT_ANY.match(key)
+    if not m: return None
+    Y=int(m.group("y")); M=int(m.group("m")); D=int(m.group("d"))
+    H=int(m.group("h")); MIN=int(m.group("min"))
+    ts = datetime.datetime(Y,M,D,H,MIN,tzinfo=timezone.utc)
+    if ts < start or ts > end: return None
+    br = m.group("br")
+    if ONLY_BROWSER!="ANY":
+        if br is None or br.upper()!=ONLY_BROWSER: return None
+    return ts, key, (br.upper() if br else "N/A"), m.group("file"), None
+
+def _iter_bundle_entries(idx: Dict[str, Any], day: datetime.date, start: datetime.datetime, end: datetime.datetime):
+    for e in idx.get("entries", []):
+        ts = datetime.datetime(day.year, day.month, day.day, int(e["t"][:2]), int(e["t"][3:5]), tzinfo=timezone.utc)
+        if ts < start or ts > end: continue
+        br = e.get("br")
+        if ONLY_BROWSER!="ANY":
+            if br is None or br.upper()!=ONLY_BROWSER: continue
+        e["bundle"] = idx["bundle"]; e["parsed_len"] = idx.get("parsed_len")
+        yield ts, e["key"], (br.upper() if br else "N/A"), e["file"], e
+
 def _iter_objects_for_month(y: int, mo: int, start: datetime.datetime, end: datetime.datetime):
+    """Yields (minute, key, browser, file, bundle_entry). Compacted days come from their bundle index
+    (bundle_entry set, no per-object listing); everything else from S3 listings (bundle_entry None)."""
     ystr = f"{y:04d}"; mstr = f"{mo:02d}"
+    bundled = _bundled_days(y, mo)
+    if bundled:
+        day = start.date()
+        while day <= end.date():
+            idx = _bundle_index(day) if day.day in bundled else None
+            if idx is not None:
+                yield from _iter_bundle_entries(idx, day, start, end)
+            else:
+                for key in _list_prefix(f"{ART_PREFIX}/{ystr}/{mstr}/{day.day:02d}/"):
+                    hit = _match_key(key, start, end)
+                    if hit: yield hit
+            day += timedelta(days=1)
+        return
     prefixes = [f"{ART_PREFIX}/{ystr}/{mstr}/", f"{ART_PREFIX}/{ystr}/"]
     yielded = False
     for p in prefixes:
         for key in _list_prefix(p):
-            m = PAT_ANY.match(key)
-            if not m: continue
-            Y=int(m.group("y")); M=int(m.group("m")); D=int(m.group("d"))
-            H=int(m.group("h")); MIN=int(m.group("min"))
-            ts = datetime.datetime(Y,M,D,H,MIN,tzinfo=timezone.utc)
-            if ts < start or ts > end: continue
-            br = m.group("br")
-            if ONLY_BROWSER!="ANY":
-                if br is None or br.upper()!=ONLY_BROWSER: continue
-            yield ts, key, (br.upper() if br else "N/A"), m.group("file")
+            hit = _match_key(key, start, end)
+            if not hit: continue
+            yield hit
             yielded=True
         if yielded: return
     # fallback: exact day/hour walk
@@ -149,53 +357,81 @@ def _iter_objects_for_month(y: int, mo: int, start: datetime.datetime, end: date
             hh=f"{h:02d}"
             p=f"{ART_PREFIX}/{ystr}/{mstr}/{dd}/{hh}/"
             for key in _list_prefix(p):
-                m = PAT_ANY.match(key)
-                if not m: continue
-                Y=int(m.group("y")); M=int(m.group("m")); D=int(m.group("d"))
-                H=int(m.group("h")); MIN=int(m.group("min"))
-                ts = datetime.datetime(Y,M,D,H,MIN,tzinfo=timezone.utc)
-                if ts < start or ts > end: continue
-                br = m.group("br")
-                if ONLY_BROWSER!="ANY":
-                    if br is None or br.upper()!=ONLY_BROWSER: continue
-                yield ts, key, (br.upper() if br else "N/A"), m.group("file")
+                hit = _match_key(key, start, end)
+                if hit: yield hit
 
 def scan_window(y: int, mo: int, start: datetime.datetime, end: datetime.datetime):
     per_min_flags={}; per_min_ms={}; sampled=[]
-    for minute_dt, key, _browser, fname in _iter_objects_for_month(y, mo, start, end):
+    bundle_cache: Dict[str, bytes] = {}
+    for minute_dt, key, _browser, fname, entry in _iter_objects_for_month(y, mo, start, end):
         sampled.append(key)
-        try:
-            body = s3.get_object(Bucket=ART_BUCKET, Key=key)["Body"].read()
-        except Exception as e:
-            log(f"[warn] get_object failed {key}: {type(e).__name__}"); continue
-        name=fname.lower(); succ=None; ms=0.0
-        try:
-            if is_synthetics_json(fname):
-                succ, ms = parse_synthetics_json(json.loads(body.decode("utf-8",errors="ignore")), fname)
-            elif name.endswith("-log.txt"):
-                succ, ms = parse_log_text(body.decode("utf-8",errors="ignore"))
-            elif name == "httprequestsreport.json":
-                data=json.loads(body.decode("utf-8",errors="ignore"))
-                codes=[(r.get("response") or {}).get("statusCode") for r in (data.get("requests") or [])]
-                codes=[c for c in codes if isinstance(c,int)]
-                succ = False if any(c>=400 for c in codes) else True
-            elif name.endswith("results.har.html"):
-                succ, ms = parse_har_html(body.decode("utf-8",errors="ignore"))
-            else:
-                continue
-        except Exception as e:
-            log(f"[warn] parse failed {key}: {type(e).__name__}"); continue
+        if entry is not None and not BUNDLE_REPARSE:
+            succ, ms = entry.get("ok"), (entry.get("ms") or 0.0)
+        else:
+            if artifact_type(fname) == "other": continue
+            try:
+                if entry is not None:
+                    body = read_bundled_payload(entry, bundle_cache)
+                else:
+                    body = s3.get_object(Bucket=ART_BUCKET, Key=key)["Body"].read()
+            except Exception as e:
+                log(f"[warn] get_object failed {key}: {type(e).__name__}"); continue
+            try:
+                succ, ms = parse_artifact(fname, body)
+            except Exception as e:
+                log(f"[warn] parse failed {key}: {type(e).__name__}"); continue
         if succ is None: continue
         per_min_flags.setdefault(minute_dt,[]).append(bool(succ))
         if ms: per_min_ms.setdefault(minute_dt,[]).append(float(ms))
     agg_ok = {t: all(flags) for t,flags in per_min_flags.items()}
     agg_ms = {t: (sum(v)/len(v) if v else 0.0) for t,v in per_min_ms.items()}
+    agg_sk = {t: DDSketch.of(v) for t,v in per_min_ms.items()}
     if TREAT_MISSING:
         cur=start.replace(second=0,microsecond=0); endr=end.replace(second=0,microsecond=0)
         while cur<=endr:
             if cur not in agg_ok: agg_ok[cur]=False; agg_ms.setdefault(cur,0.0)
             cur += timedelta(minutes=1)
-    return agg_ok, agg_ms, sampled[:250]
+    return agg_ok, agg_ms, agg_sk, sampled[:250]
+
+# -------------------------- Bundles ---------------------------------
+# A compacted day is two objects under ART_PREFIX/_bundles/YYYY/MM/:
+#   DD.bundle          every raw artifact of the day, each as its own gzip member, concatenated;
+#                      parseable types first, screenshots and other files after them
+#   DD.index.json.gz   {"day", "bundle", "parsed_len", "entries": [{key, t, br, file, type, ok, ms, off, len, size}]}
+# ok/ms are the parser results at compaction time; off/len locate the member inside DD.bundle;
+# parsed_len is the byte length of the parseable prefix, so a re-parse never downloads the rest.
+# The index is written last, so its presence marks a complete bundle.
+def _bundle_base(day: datetime.date) -> str:
+    return f"{ART_PREFIX}/_bundles/{day:%Y}/{day:%m}/{day:%d}"
+
+def _bundled_days(y: int, mo: int) -> set:
+    days = set()
+    for key in _list_prefix(f"{ART_PREFIX}/_bundles/{y:04d}/{mo:02d}/"):
+        name = key.rsplit("/", 1)[-1]
+        if name.endswith(".index.json.gz") and name[:2].isdigit():
+            days.add(int(name[:2]))
+    return days
+
+def _bundle_index(day: datetime.date) -> Optional[Dict[str, Any]]:
+    try:
+        body = s3.get_object(Bucket=ART_BUCKET, Key=f"{_bundle_base(day)}.index.json.gz")["Body"].read()
+        return json.loads(gzip.decompress(body).decode("utf-8"))
+    except Exception as e:
+        log(f"[warn] bundle index {day} unreadable, using raw objects: {type(e).__name__}")
+        return None
+
+def read_bundled_payload(entry: Dict[str, Any], cache: Optional[Dict[str, bytes]] = None) -> bytes:
+    """Original payload of one bundle entry via a ranged GET. With a cache and an entry inside the
+    parseable prefix, that prefix is fetched once per day (cache holds one day); otherwise just the member."""
+    off, n, span = entry["off"], entry["len"], entry.get("parsed_len")
+    if cache is not None and span and off + n <= span:
+        bkey = entry["bundle"]
+        if bkey not in cache:
+            cache.clear()
+            cache[bkey] = s3.get_object(Bucket=ART_BUCKET, Key=bkey, Range=f"bytes=0-{span - 1}")["Body"].read()
+        return gzip.decompress(cache[bkey][off:off + n])
+    rng = f"bytes={off}-{off + n - 1}"
+    return gzip.decompress(s3.get_object(Bucket=ART_BUCKET, Key=entry["bundle"], Range=rng)["Body"].read())
 
 # -------------------------- Reductions ------------------------------
 def hourly_reduce(agg_ok: Dict[datetime.datetime,bool], agg_ms: Dict[datetime.datetime,float]):
@@ -270,129 +506,188 @@ def _read_month_summary_from_csv(y: int, m: int) -> Optional[Dict[str,float]]:
     except Exception:
         return None
 
+def _sampled_duration_ms(key: str) -> Optional[float]:
+    try:
+        body = s3.get_object(Bucket=ART_BUCKET, Key=key)["Body"].read()
+        data = json.loads(body.decode("utf-8", errors="ignore"))
+        _, dur_ms = parse_synthetics_json(data, key.rsplit("/", 1)[-1])
+        return float(dur_ms) if isinstance(dur_ms, (int, float)) else None
+    except Exception:
+        return None
+
+def estimate_mean_adaptive(keys: List[str], population: int) -> Dict[str, Optional[float]]:
+    """Mean SyntheticsReport duration (ms) from `keys`, fetched SAMPLE_BATCH at a time on sample_pool.
+    Stops once the SAMPLE_Z confidence half-width (with finite-population correction against
+    `population` reports) is within SAMPLE_REL_TOL of the mean, after at least SAMPLE_MIN values.
+    mean_ms is None when no duration was read; half_ms is None when fewer than 2 were read from a
+    larger population (no variance to bound the error)."""
+    n = s1 = s2 = 0.0
+    mean = half = 0.0
+    fetched = 0
+    for i in range(0, len(keys), SAMPLE_BATCH):
+        batch = keys[i:i+SAMPLE_BATCH]; fetched += len(batch)
+        for v in sample_pool.map(_sampled_duration_ms, batch):
+            if v is None: continue
+            n += 1; s1 += v; s2 += v*v
+        if n < 2: continue
+        mean = s1 / n
+        var = max(0.0, (s2 - s1*s1/n) / (n - 1))
+        fpc = ((population - n) / (population - 1)) if population > n else 0.0
+        half = SAMPLE_Z * (var / n * fpc) ** 0.5
+        if n >= SAMPLE_MIN and half <= SAMPLE_REL_TOL * abs(mean):
+            break
+    if n < 2:
+        mean = s1 if n else None
+        half = 0.0 if n and population <= n else None
+    return {"mean_ms": mean, "half_ms": half, "n": int(n), "fetched": fetched}
+
 def summarize_month_from_artifacts_quick(y: int, m: int, sample_limit: int=400) -> Optional[Dict[str,float]]:
-    prefix = f"{ART_PREFIX}/{y:04d}/{m:02d}/"
+    """Availability from SyntheticsReport file names; response time estimated from an adaptive
+    sample (at most sample_limit GETs). resp_s_err is the CI half-width in seconds, None (with
+    resp_s_ci) when the sample is too small to bound it; resp_s is None when no duration was read.
+    Compacted days are counted exactly from their bundle index, without listing or sampling."""
     passed = failed = 0
     sample = []
     seen = 0
+    exact_n = 0; exact_ms = 0.0
+
+    bundled = _bundled_days(y, m)
+    if bundled:
+        prefixes = []
+        for d in range(1, _last_of_month(y, m).day + 1):
+            idx = _bundle_index(datetime.date(y, m, d)) if d in bundled else None
+            if idx is None:
+                prefixes.append(f"{ART_PREFIX}/{y:04d}/{m:02d}/{d:02d}/"); continue
+            for e in idx.get("entries", []):
+                if e.get("type") != "synthetics": continue
+                if ONLY_BROWSER != "ANY":
+                    if e.get("br") is None or e["br"].upper() != ONLY_BROWSER: continue
+                fname = e["file"].lower()
+                if "-passed" in fname: passed += 1
+                elif "-failed" in fname: failed += 1
+                if e.get("ok") is not None:
+                    exact_n += 1; exact_ms += float(e.get("ms") or 0.0)
+    else:
+        prefixes = [f"{ART_PREFIX}/{y:04d}/{m:02d}/"]
 
-    token = None
-    while True:
-        if token:
-            resp = s3.list_objects_v2(Bucket=ART_BUCKET, Prefix=prefix, ContinuationToken=token, MaxKeys=1000)
-        else:
-            resp = s3.list_objects_v2(Bucket=ART_BUCKET, Prefix=prefix, MaxKeys=1000)
-        for obj in resp.get("Contents", []):
-            key = obj["Key"]
-            mobj = PAT_ANY.match(key)
-            if not mobj:
-                continue
-            br = mobj.group("br")
-            if ONLY_BROWSER != "ANY":
-                if br is None or br.upper() != ONLY_BROWSER:
+    for prefix in prefixes:
+        token = None
+        while True:
+            if token:
+                resp = s3.list_objects_v2(Bucket=ART_BUCKET, Prefix=prefix, ContinuationToken=token, MaxKeys=1000)
+            else:
+                resp = s3.list_objects_v2(Bucket=ART_BUCKET, Prefix=prefix, MaxKeys=1000)
+            for obj in resp.get("Contents", []):
+                key = obj["Key"]
+                mobj = PAT_ANY.match(key)
+                if not mobj:
                     continue
-            fname = mobj.group("file").lower()
-            if fname.startswith("syntheticsreport-") and fname.endswith(".json"):
-                seen += 1
-                if "-passed" in fname:
-                    passed += 1
-                elif "-failed" in fname:
-                    failed += 1
-                if len(sample) < sample_limit:
-                    sample.append(key)
-                else:
-                    j = random.randint(1, seen)
-                    if j <= sample_limit:
-                        sample[random.randint(0, sample_limit-1)] = key
-        if resp.get("IsTruncated"):
-            token = resp.get("NextContinuationToken")
-        else:
-            break
+                br = mobj.group("br")
+                if ONLY_BROWSER != "ANY":
+                    if br is None or br.upper() != ONLY_BROWSER:
+                        continue
+                fname = mobj.group("file").lower()
+                if fname.startswith("syntheticsreport-") and fname.endswith(".json"):
+                    seen += 1
+                    if "-passed" in fname:
+                        passed += 1
+                    elif "-failed" in fname:
+                        failed += 1
+                    if len(sample) < sample_limit:
+                        sample.append(key)
+                    else:
+                        j = random.randint(0, seen-1)
+                        if j < sample_limit:
+                            sample[j] = key
+            if resp.get("IsTruncated"):
+                token = resp.get("NextContinuationToken")
+            else:
+                break
 
     total = passed + failed
     if total == 0:
         return None
 
-    dur_ms_vals = []
-    for k in sample:
-        try:
-            body = s3.get_object(Bucket=ART_BUCKET, Key=k)["Body"].read()
-            data = json.loads(body.decode("utf-8", errors="ignore"))
-            _, dur_ms = parse_synthetics_json(data, k.rsplit("/", 1)[-1])
-            if isinstance(dur_ms, (int, float)):
-                dur_ms_vals.append(float(dur_ms))
-        except Exception:
-            continue
-
-    resp_s = (sum(dur_ms_vals) / len(dur_ms_vals) / 1000.0) if dur_ms_vals else 0.0
+    random.shuffle(sample)  # early stop must see a random prefix, not listing order
+    est = estimate_mean_adaptive(sample, seen)
+    err_txt = "n/a" if est["half_ms"] is None else f"{est['half_ms']:.1f} ms"
+    log(f"[info] {y}-{m:02d} response sample: {est['n']} of {seen} in {est['fetched']} GETs (±{err_txt})"
+        + (f", {exact_n} exact from bundles" if exact_n else ""))
+
+    # raw (sampled) and bundled (exact) strata, weighted by their report counts; an unmeasured raw
+    # stratum leaves the mean to the bundles and the error unknown
+    raw_w = seen if est["n"] else 0
+    pop = raw_w + exact_n
+    mean_ms = ((est["mean_ms"] * raw_w if raw_w else 0.0) + exact_ms) / pop if pop else None
+    half_ms = None if (seen and est["half_ms"] is None) or mean_ms is None else (est["half_ms"] or 0.0) * raw_w / pop
+
+    resp_s = None if mean_ms is None else mean_ms / 1000.0
+    resp_s_err = None if half_ms is None else half_ms / 1000.0
+    resp_s_ci = None if resp_s_err is None else [max(0.0, resp_s - resp_s_err), resp_s + resp_s_err]
     availability = (passed / total) * 100.0
-    return {"availability": availability, "resp_s": resp_s}
+    return {"availability": availability, "resp_s": resp_s, "resp_s_err": resp_s_err,
+            "resp_s_ci": resp_s_ci, "resp_samples": est["n"] + exact_n}
 
-def build_year_summary_ytd(current_avail: float, current_resp_s: float):
-    now = _now_utc()
-    y = now.year
-    months = list(range(1, now.month + 1))
+# avg_response_sec_ci95: ± half-width for months estimated from a sample; blank when exact
+YEAR_SUMMARY_COLS = ["month","availability_pct","avg_response_sec","avg_response_sec_ci95"]
 
+def build_year_summary(y: int, through_month: int, known: Optional[Dict[int, Dict[str,float]]] = None):
+    """Year summary rows for Jan..through_month of y. Months in `known` are used as-is;
+    the rest come from their stored hour/minute CSVs or a quick artifact estimate."""
+    known = known or {}
     chart, table, csvout = [], [], []
-    for m in months:
-        if m == now.month:
-            avail, resp = current_avail, current_resp_s
+    for m in range(1, through_month + 1):
+        s = known[m] if m in known else _stored_month_summary(y, m)
+        if s:
+            avail, resp, err = s["availability"], s["resp_s"], s.get("resp_s_err")
         else:
-            s = _read_month_summary_from_csv(y, m) or summarize_month_from_artifacts_quick(y, m)
-            if s:
-                avail, resp = s["availability"], s["resp_s"]
-            else:
-                avail, resp = None, None
+            avail, resp, err = None, None, None
 
-        chart.append({"month": f"{y}-{m:02d}", "availability": avail, "resp_s": resp})
-        table.append({"label": _month_label(y, m), "availability": avail, "resp_s": resp})
+        chart.append({"month": f"{y}-{m:02d}", "availability": avail, "resp_s": resp, "resp_s_err": err})
+        table.append({"label": _month_label(y, m), "availability": avail, "resp_s": resp, "resp_s_err": err})
         csvout.append({
             "month": f"{y}-{m:02d}",
             "availability_pct": "" if avail is None else f"{avail:.3f}",
             "avg_response_sec": "" if resp is None else f"{resp:.3f}",
+            "avg_response_sec_ci95": "" if err is None else f"{err:.3f}",
         })
     return chart, table, csvout
 
-def compute_slo_auto(now: datetime.datetime, lookback_months: int = 3) -> float:
+def build_year_summary_ytd(current_avail: float, current_resp_s: float):
+    now = _now_utc()
+    return build_year_summary(now.year, now.month, {now.month: {"availability": current_avail, "resp_s": current_resp_s}})
+
+def _stored_month_summary(y: int, m: int) -> Optional[Dict[str,float]]:
+    """A past month from its stored CSVs, else a quick artifact estimate; None when neither has data."""
+    return _read_month_summary_from_csv(y, m) or summarize_month_from_artifacts_quick(y, m)
+
+def _slo_lookback(y: int, m: int, lookback_months: int = 3) -> List[Tuple[int,int]]:
+    """The (year, month)s before y-m that compute_slo_auto takes the median of."""
+    return [(y, m - i) if m - i > 0 else (y - 1, m - i + 12) for i in range(1, lookback_months + 1)]
+
+def _slo_is_fixed() -> bool:
+    return isinstance(SLO_TARGET, (int,float)) or (isinstance(SLO_TARGET,str) and SLO_TARGET.replace('.','',1).isdigit())
+
+def compute_slo_auto(now: datetime.datetime, lookback_months: int = 3,
+                     known: Optional[Dict[Tuple[int,int], Optional[Dict[str,float]]]] = None) -> float:
+    """Median availability of the lookback months. Months in `known` (even None) are not fetched again."""
     vals = []
-    y = now.year; m = now.month
-    for i in range(1, lookback_months+1):
-        pm = m - i; py = y
-        if pm <= 0: pm += 12; py -= 1
-        s = _read_month_summary_from_csv(py, pm)
-        if not s:
-            s = summarize_month_from_artifacts_quick(py, pm)
+    known = known or {}
+    for ym in _slo_lookback(now.year, now.month, lookback_months):
+        s = known[ym] if ym in known else _stored_month_summary(*ym)
         if s and isinstance(s.get("availability"), (int,float)):
             vals.append(float(s["availability"]))
     if len(vals) >= 1:
         return float(f"{median(vals):.3f}")
     return 99.9
 
-# --------------------------- HTML -----------------------------------
-def render_html(meta, minute_rows, hour_rows, month_cum_rows_padded, per_canary,
-                year_chart_rows, year_table_rows, incidents, generated_at):
+def resolve_slo(now: datetime.datetime, known: Optional[Dict[Tuple[int,int], Dict[str,float]]] = None) -> float:
+    if _slo_is_fixed():
+        return float(SLO_TARGET)
+    return compute_slo_auto(now, known=known)
 
-    min_js = ",\n      ".join("[new Date('{}Z'), {:.3f}]".format(r["ts"], r["avail"]) for r in minute_rows)
-    hr_js  = ",\n      ".join("[new Date('{}Z'), {:.3f}]".format(r["hour"], r["avail"]) for r in hour_rows)
-    mc_js  = ",\n      ".join("['{}', {}]".format(r["day"], _num_or_null(r["avail"])) for r in month_cum_rows_padded)
-    year_js = ",\n      ".join("['{}', {}]".format(r["month"], _num_or_null(r["availability"])) for r in year_chart_rows)
-    per_js = ",\n      ".join("['{}', {:.3f}]".format(p["name"], p["pct"]) for p in per_canary)
-
-    table_rows_html = "".join(
-        "<tr><td>{}</td><td align='right'>{}</td></tr>".format(
-            row["label"],
-            ("{:.3f}%".format(row["availability"]) if row["availability"] is not None else "—")
-        ) for row in year_table_rows
-    )
-
-    incidents_rows = "".join(
-        f"<tr><td>{i['start'].strftime('%Y-%m-%d %H:%M')}</td>"
-        f"<td>{i['end'].strftime('%Y-%m-%d %H:%M')}</td>"
-        f"<td style='text-align:right'>{i['duration_minutes']}</td></tr>"
-        for i in incidents
-    )
-
-    page = Template(r"""<!doctype html>
+# --------------------------- HTML -----------------------------------
+REPORT_TEMPLATE = r"""<!doctype html>
 <html lang="en">
 <head>
   <meta charset="utf-8" />
@@ -571,9 +866,61 @@ def render_html(meta, minute_rows, hour_rows, month_cum_rows_padded, per_canary,
   </script>
 </body>
 </html>
-""")
-
-    html = page.substitute(
+"""
+
+def _compile_template(text: str) -> List[Tuple[bool, str]]:
+    """Split a string.Template into (is_field, text) segments, with $$, $name and ${name} handled
+    exactly as Template.substitute does."""
+    segs: List[Tuple[bool, str]] = []; lit = []; pos = 0
+    for mt in Template.pattern.finditer(text):
+        if mt.group("invalid") is not None:
+            raise ValueError(f"Invalid placeholder in report template at offset {mt.start('invalid')}")
+        lit.append(text[pos:mt.start()])
+        if mt.group("escaped") is not None:
+            lit.append(Template.delimiter)
+        else:
+            segs.append((False, "".join(lit))); lit = []
+            segs.append((True, mt.group("named") or mt.group("braced")))
+        pos = mt.end()
+    lit.append(text[pos:])
+    segs.append((False, "".join(lit)))
+    return [sg for sg in segs if sg[0] or sg[1]]
+
+# parsed once per container; iter_report_chunks walks these segments
+_REPORT_SEGMENTS = _compile_template(REPORT_TEMPLATE)
+
+def _joined(items, sep: str, block: int = 2048) -> Iterator[str]:
+    """sep.join(items) as a stream of chunks of up to `block` items each."""
+    first = True; buf = []
+    for it in items:
+        buf.append(it)
+        if len(buf) >= block:
+            yield ("" if first else sep) + sep.join(buf); first = False; buf = []
+    if buf:
+        yield ("" if first else sep) + sep.join(buf)
+
+def iter_report_chunks(meta, minute_rows, hour_rows, month_cum_rows_padded, per_canary,
+                       year_chart_rows, year_table_rows, incidents, generated_at) -> Iterator[str]:
+    """The report HTML as a stream of str chunks; "".join() of it is what render_html returns."""
+    sep = ",\n      "
+    series = {
+        "min_js": lambda: _joined(("[new Date('{}Z'), {:.3f}]".format(r["ts"], r["avail"]) for r in minute_rows), sep),
+        "hr_js": lambda: _joined(("[new Date('{}Z'), {:.3f}]".format(r["hour"], r["avail"]) for r in hour_rows), sep),
+        "mc_js": lambda: _joined(("['{}', {}]".format(r["day"], _num_or_null(r["avail"])) for r in month_cum_rows_padded), sep),
+        "year_js": lambda: _joined(("['{}', {}]".format(r["month"], _num_or_null(r["availability"])) for r in year_chart_rows), sep),
+        "per_js": lambda: _joined(("['{}', {:.3f}]".format(p["name"], p["pct"]) for p in per_canary), sep),
+        "table_rows_html": lambda: _joined((
+            "<tr><td>{}</td><td align='right'>{}</td></tr>".format(
+                row["label"],
+                ("{:.3f}%".format(row["availability"]) if row["availability"] is not None else "—")
+            ) for row in year_table_rows), ""),
+        "incidents_rows": lambda: _joined((
+            f"<tr><td>{i['start'].strftime('%Y-%m-%d %H:%M')}</td>"
+            f"<td>{i['end'].strftime('%Y-%m-%d %H:%M')}</td>"
+            f"<td style='text-align:right'>{i['duration_minutes']}</td></tr>"
+            for i in incidents), ""),
+    }
+    scalars = dict(
         title=f"{meta['service']} Monthly Uptime — {meta['month_name']} {meta['year']}",
         company=meta["company"],
         client=meta["client"],
@@ -586,13 +933,21 @@ def render_html(meta, minute_rows, hour_rows, month_cum_rows_padded, per_canary,
         availability=f"{meta['availability']:.3f}",
         downtime_min=meta["downtime_min"],
         incidents=meta["incidents"],
-        min_js=min_js, hr_js=hr_js, mc_js=mc_js, year_js=year_js, per_js=per_js,
-        table_rows_html=table_rows_html,
         fail_streak=FAIL_STREAK,
         missing_policy=("treated as failures" if TREAT_MISSING else "ignored"),
-        incidents_rows=incidents_rows
     )
-    return html
+    for is_field, text in _REPORT_SEGMENTS:
+        if not is_field:
+            yield text
+        elif text in series:
+            yield from series[text]()
+        else:
+            yield str(scalars[text])
+
+def render_html(meta, minute_rows, hour_rows, month_cum_rows_padded, per_canary,
+                year_chart_rows, year_table_rows, incidents, generated_at):
+    return "".join(iter_report_chunks(meta, minute_rows, hour_rows, month_cum_rows_padded, per_canary,
+                                      year_chart_rows, year_table_rows, incidents, generated_at))
 
 # --------------------------- S3 helpers ------------------------------
 def _put_csv(bucket: str, key: str, rows: List[Dict[str, Any]], cols: List[str]) -> None:
@@ -603,20 +958,67 @@ def _put_csv(bucket: str, key: str, rows: List[Dict[str, Any]], cols: List[str])
         w.writerow(r)
     s3.put_object(Bucket=bucket, Key=key, Body=out.getvalue().encode("utf-8"), ContentType="text/csv; charset=utf-8")
 
-# --------------------------- Handler --------------------------------
-def handler(event, context):
-    # quick sanity to avoid silent misconfigs
-    if not ART_BUCKET or not REPORTS_BUCKET:
-        raise ValueError(f"ART_BUCKET/REPORTS_BUCKET must be set: ART_BUCKET={repr(ART_BUCKET)}, REPORTS_BUCKET={repr(REPORTS_BUCKET)}")
+def _put_html(key: str, html: str) -> None:
+    s3.put_object(Bucket=REPORTS_BUCKET, Key=key, Body=html.encode("utf-8"), ContentType="text/html; charset=utf-8")
 
-    now = _now_utc()
-    start_m, end_m = month_window_utc(now)
-    y = start_m.year; mo = start_m.month
+def write_stream(chunks: Iterator[str], bucket: str, key: str,
+                 content_type: str = "text/html; charset=utf-8", part_size: int = UPLOAD_PART_SIZE) -> int:
+    """Encode str chunks straight into an upload buffer. One put_object when the whole body fits in
+    part_size, otherwise a multipart upload of part_size parts. Returns the bytes written."""
+    buf = io.BytesIO(); total = 0
+    upload_id = None; parts: List[Dict[str, Any]] = []
+
+    def flush():
+        buf.seek(0)
+        n = len(parts) + 1
+        etag = s3.upload_part(Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=n, Body=buf)["ETag"]
+        parts.append({"PartNumber": n, "ETag": etag})
 
-    # Scan current month (MTD)
-    agg_ok, agg_ms, _sampled = scan_window(y, mo, start_m, end_m)
+    try:
+        for ch in chunks:
+            total += buf.write(ch.encode("utf-8"))
+            if buf.tell() >= part_size:
+                if upload_id is None:
+                    upload_id = s3.create_multipart_upload(Bucket=bucket, Key=key, ContentType=content_type)["UploadId"]
+                flush(); buf = io.BytesIO()
+        if upload_id is None:
+            buf.seek(0)
+            s3.put_object(Bucket=bucket, Key=key, Body=buf, ContentType=content_type)
+            return total
+        if buf.tell():
+            flush()
+        s3.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts})
+        return total
+    except Exception:
+        if upload_id is not None:
+            try: s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+            except Exception: pass
+        raise
+
+# --------------------------- PDF handoff ----------------------------
+def handoff_pdf(y: int, mo: int, html: str, html_key: str) -> Dict[str, Any]:
+    """Render the PDF by invoking PDF_LAMBDA_ARN synchronously with the HTML inline.
+    Reports whose event would exceed HANDOFF_INLINE_MAX are written to html_key and passed by key."""
+    ev = {"year": f"{y:04d}", "month": f"{mo:02d}", "html_key": html_key}
+    payload = json.dumps({**ev, "html": html}).encode("utf-8")
+    via = "inline"
+    if len(payload) > HANDOFF_INLINE_MAX:
+        _put_html(html_key, html)
+        payload = json.dumps(ev).encode("utf-8"); via = "s3"
+    resp = lam.invoke(FunctionName=PDF_LAMBDA_ARN, InvocationType="RequestResponse", Payload=payload)
+    out = json.loads(resp["Payload"].read() or b"{}")
+    body = out.get("body")
+    try: body = json.loads(body) if isinstance(body, str) else body
+    except ValueError: pass
+    return {"via": via, "status": out.get("statusCode"), "function_error": resp.get("FunctionError"), "response": body}
+
+# ------------------------ Month pipeline ----------------------------
+def build_month(y: int, mo: int, start_m: datetime.datetime, end_m: datetime.datetime) -> Dict[str, Any]:
+    """Scan one month window and write its minute/hour/cumulative CSVs under REPORTS_PREFIX/{y}/{mm}/.
+    Returns the reduced rows the YTD and HTML steps need."""
+    agg_ok, agg_ms, agg_sk, _sampled = scan_window(y, mo, start_m, end_m)
     observed = sorted(agg_ok.keys()); total_obs=len(observed)
-    log(f"[info] observed minutes this month: {total_obs}")
+    log(f"[info] observed minutes {y}-{mo:02d}: {total_obs}")
     up_obs=sum(1 for t in observed if agg_ok[t])
     availability=(up_obs/total_obs)*100.0 if total_obs else 0.0
     incidents=detect_incidents(agg_ok)
@@ -630,13 +1032,24 @@ def handler(event, context):
              [{"timestamp_utc": r["ts"], "availability_pct": f"{r['avail']:.3f}", "avg_response_sec": f"{r['resp_s']:.3f}"} for r in minute_rows],
              ["timestamp_utc","availability_pct","avg_response_sec"])
 
+    # Response-time sketches (hour/day/month), mergeable for any window later
+    hour_sk, day_sk, month_sk = sketch_rollups(agg_sk)
+    s3.put_object(Bucket=REPORTS_BUCKET, Key=f"{base}uptime-sketches.json",
+                  Body=json.dumps(sketches_doc(hour_sk, day_sk, month_sk), separators=(",", ":")).encode("utf-8"),
+                  ContentType="application/json")
+
     # Hour CSV (MTD)
     hour_rows=hourly_reduce(agg_ok, agg_ms)
+    def _q_sec(hr, q):
+        sk = hour_sk.get(hr); v = sk.quantile(q) if sk else None
+        return "" if v is None else f"{v/1000.0:.3f}"
     _put_csv(REPORTS_BUCKET, f"{base}uptime-hour.csv",
              [{"hour_utc": r["hour"].strftime("%Y-%m-%d %H:%M"),
                "availability_pct": f"{(r['success_avg'] or 0.0):.3f}",
-               "avg_response_sec": f"{((r['response_ms_avg'] or 0.0)/1000.0):.3f}"} for r in hour_rows],
-             ["hour_utc","availability_pct","avg_response_sec"])
+               "avg_response_sec": f"{((r['response_ms_avg'] or 0.0)/1000.0):.3f}",
+               "p95_response_sec": _q_sec(r["hour"], 0.95),
+               "p99_response_sec": _q_sec(r["hour"], 0.99)} for r in hour_rows],
+             ["hour_utc","availability_pct","avg_response_sec","p95_response_sec","p99_response_sec"])
 
     # Month-to-date cumulative CSV (daily)
     mc_rows = month_cumulative(agg_ok, agg_ms)
@@ -656,53 +1069,347 @@ def handler(event, context):
                "cumulative_avg_response_sec": "" if r["resp_s"] is None else f"{r['resp_s']:.3f}"} for r in mc_rows_padded],
              ["day_utc","cumulative_availability_pct","cumulative_avg_response_sec"])
 
+    return dict(y=y, mo=mo, start=start_m, end=end_m, base=base,
+                availability=availability, incidents=incidents, downtime_min=downtime_min,
+                minute_rows=minute_rows, hour_rows=hour_rows, mc_rows_padded=mc_rows_padded,
+                response_ms={"p50": month_sk.quantile(0.5), "p95": month_sk.quantile(0.95), "p99": month_sk.quantile(0.99)})
+
+def _month_summary(m: Dict[str, Any]) -> Optional[Dict[str, float]]:
+    """YTD entry for a freshly built month, equal to what _read_month_summary_from_csv returns for the
+    uptime-hour.csv it just wrote: the mean of the hourly values as rounded in that CSV."""
+    hrs = m["hour_rows"]
+    if not hrs:
+        return None
+    avail = [round(r["success_avg"] or 0.0, 3) for r in hrs]
+    resp = [round((r["response_ms_avg"] or 0.0)/1000.0, 3) for r in hrs]
+    return {"availability": sum(avail)/len(avail), "resp_s": sum(resp)/len(resp)}
+
+def publish_month(m: Dict[str, Any], slo_val: float, year_chart_rows, year_table_rows,
+                  now: datetime.datetime) -> Dict[str, Any]:
+    """Render the 3-page HTML for a built month and hand it to the PDF Lambda or write it to S3."""
+    y, mo = m["y"], m["mo"]
+    meta=dict(
+        company=COMPANY, client=CLIENT, service=SERVICE,
+        year=str(y), month_name=m["start"].strftime("%B"), slo=slo_val,
+        availability=m["availability"], downtime_min=m["downtime_min"],
+        incidents=len(m["incidents"])
+    )
+
+    chunks = iter_report_chunks(
+        meta,
+        m["minute_rows"],
+        [{"hour": r["hour"].strftime("%Y-%m-%d %H:%M"), "avail": (r["success_avg"] or 0.0)} for r in m["hour_rows"]],
+        [{"day": r["day"], "avail": r["avail"]} for r in m["mc_rows_padded"]],
+        [{"name": ART_PREFIX.split('/')[-1] if ART_PREFIX else 'artifacts', "pct": m["availability"]}],
+        year_chart_rows,
+        year_table_rows,
+        m["incidents"],
+        generated_at=now.strftime("%Y-%m-%d %H:%M UTC")
+    )
+
+    html_key = f"{m['base']}uptime-report.html"
+    pdf = None; pdf_error = None
+    if PDF_LAMBDA_ARN:
+        # the inline handoff needs the whole document as one string
+        html = "".join(chunks)
+        try:
+            pdf = handoff_pdf(y, mo, html, html_key)
+            log(f"[info] pdf handoff via {pdf['via']}: status={pdf['status']} error={pdf['function_error']}")
+            if pdf["function_error"] or pdf["status"] != 200:
+                pdf_error = f"PDF Lambda returned status={pdf['status']} function_error={pdf['function_error']}"
+        except Exception as e:
+            pdf_error = f"{type(e).__name__}: {e}"
+        if pdf_error:
+            log(f"[warn] pdf handoff failed, keeping HTML in S3: {pdf_error}")
+            # an oversized handoff already wrote the HTML before invoking
+            if pdf is None or pdf["via"] != "s3":
+                _put_html(html_key, html)
+    else:
+        write_stream(chunks, REPORTS_BUCKET, html_key)
+    html_in_s3 = pdf is None or pdf["via"] == "s3" or pdf_error is not None
+
+    return {
+        "result": {"bucket": REPORTS_BUCKET, "key": html_key if html_in_s3 else None},
+        "html": f"s3://{REPORTS_BUCKET}/{html_key}" if html_in_s3 else None,
+        "pdf": pdf,
+        "pdf_error": pdf_error
+    }
+
+# --------------------------- Profiling ------------------------------
+_PROFILE_DESTS = ("s3://", "/")
+
+def _profile_on(v) -> bool:
+    if isinstance(v, str):
+        return v.startswith(_PROFILE_DESTS) or (v.strip().lower() in ("1", "true", "yes", "on"))
+    return bool(v)
+
+def _profile_target(event) -> Optional[str]:
+    """Profile destination for this run, or None. The event's "profile" wins when it is a destination;
+    otherwise PROFILE_OUTPUT if it is one, else REPORTS_PREFIX/_profiles in REPORTS_BUCKET."""
+    flag = event.get("profile") if isinstance(event, dict) else None
+    if isinstance(flag, str) and flag.startswith(_PROFILE_DESTS): return flag
+    if not (_profile_on(flag) or _profile_on(PROFILE_OUTPUT)): return None
+    return PROFILE_OUTPUT if PROFILE_OUTPUT.startswith(_PROFILE_DESTS) else f"s3://{REPORTS_BUCKET}/{REPORTS_PREFIX}/_profiles"
+
+def _write_profile(prof: cProfile.Profile, target: str, name: str, top_n: int) -> str:
+    """Dump target/<name>.prof for pstats/snakeviz plus a <name>.txt top-N summary; returns the base path."""
+    out = io.StringIO()
+    st = pstats.Stats(prof, stream=out)
+    st.sort_stats("cumulative").print_stats(top_n)
+    st.sort_stats("tottime").print_stats(top_n)
+    tmp = f"/tmp/{name}.prof"
+    st.dump_stats(tmp)
+    if target.startswith("s3://"):
+        bucket, _, prefix = target[5:].partition("/")
+        base = f"{prefix.strip('/')}/{name}".lstrip("/")
+        s3.upload_file(tmp, bucket, f"{base}.prof")
+        s3.put_object(Bucket=bucket, Key=f"{base}.txt", Body=out.getvalue().encode("utf-8"), ContentType="text/plain; charset=utf-8")
+        os.remove(tmp)
+        return f"s3://{bucket}/{base}"
+    os.makedirs(target, exist_ok=True)
+    base = os.path.join(target, name)
+    os.replace(tmp, f"{base}.prof")
+    with open(f"{base}.txt", "w") as f: f.write(out.getvalue())
+    return base
+
+def profiled(fn):
+    """Run fn under cProfile when _profile_target(event) asks for it; a plain call otherwise.
+    Only the invoking thread is profiled (pool workers show up as wait time)."""
+    @functools.wraps(fn)
+    def wrapper(event, context=None):
+        target = _profile_target(event)
+        if not target:
+            return fn(event, context)
+        prof = cProfile.Profile()
+        try:
+            return prof.runcall(fn, event, context)
+        finally:
+            name = f"{fn.__name__}-{_now_utc().strftime('%Y%m%dT%H%M%SZ')}-{getattr(context, 'aws_request_id', 'local')}"
+            try:
+                top_n = int((event or {}).get("profile_top") or PROFILE_TOP_N)
+                log(f"[info] profile written: {_write_profile(prof, target, name, top_n)}")
+            except Exception as e:
+                log(f"[warn] profile write failed: {type(e).__name__}: {e}")
+    return wrapper
+
+# --------------------------- Handler --------------------------------
+def _check_config() -> None:
+    # quick sanity to avoid silent misconfigs
+    if not ART_BUCKET or not REPORTS_BUCKET:
+        raise ValueError(f"ART_BUCKET/REPORTS_BUCKET must be set: ART_BUCKET={repr(ART_BUCKET)}, REPORTS_BUCKET={repr(REPORTS_BUCKET)}")
+
+@profiled
+def handler(event, context):
+    if isinstance((event or {}).get("backfill"), dict):
+        return backfill_handler(event["backfill"], context)
+    _check_config()
+
+    now = _now_utc()
+    start_m, end_m = month_window_utc(now)
+    y = start_m.year; mo = start_m.month
+
+    # Scan current month (MTD) and write its CSVs
+    m = build_month(y, mo, start_m, end_m)
+
     # SLO (auto or fixed)
-    slo_val = float(SLO_TARGET) if (isinstance(SLO_TARGET, (int,float)) or (isinstance(SLO_TARGET,str) and SLO_TARGET.replace('.','',1).isdigit())) else compute_slo_auto(now)
+    slo_val = resolve_slo(now)
 
     # YTD summary
     try:
         year_chart_rows, year_table_rows, year_csv = build_year_summary_ytd(
-            availability,
+            m["availability"],
             0.0,  # we no longer chart response; keep CSV schema
         )
         _put_csv(REPORTS_BUCKET, f"{REPORTS_PREFIX}/{y}/uptime-year-summary.csv",
-                 year_csv, ["month","availability_pct","avg_response_sec"])
+                 year_csv, YEAR_SUMMARY_COLS)
     except Exception as e:
         log(f"[warn] YTD summary skipped: {type(e).__name__}")
         year_chart_rows, year_table_rows = [], []
 
     # Render HTML (3 pages)
-    meta=dict(
-        company=COMPANY, client=CLIENT, service=SERVICE,
-        year=str(y), month_name=start_m.strftime("%B"), slo=slo_val,
-        availability=availability, downtime_min=downtime_min,
-        incidents=len(incidents)
-    )
+    out = publish_month(m, slo_val, year_chart_rows, year_table_rows, now)
 
-    html = render_html(
-        meta,
-        minute_rows,
-        [{"hour": r["hour"].strftime("%Y-%m-%d %H:%M"), "avail": (r["success_avg"] or 0.0)} for r in hour_rows],
-        [{"day": r["day"], "avail": r["avail"]} for r in mc_rows_padded],
-        [{"name": ART_PREFIX.split('/')[-1] if ART_PREFIX else 'artifacts', "pct": availability}],
-        year_chart_rows,
-        year_table_rows,
-        incidents,
-        generated_at=now.strftime("%Y-%m-%d %H:%M UTC")
-    )
+    return {
+        "status":"ok" if not out["pdf_error"] else "pdf_failed",
+        "artifacts": {"bucket": ART_BUCKET, "prefix": ART_PREFIX},
+        "reports": {"bucket": REPORTS_BUCKET, "prefix": REPORTS_PREFIX},
+        "response_ms": m["response_ms"],
+        **out
+    }
 
-    html_key = f"{base}uptime-report.html"
-    s3.put_object(
-        Bucket=REPORTS_BUCKET,
-        Key=html_key,
-        Body=html.encode("utf-8"),
-        ContentType="text/html; charset=utf-8"
-    )
+# --------------------------- Backfill -------------------------------
+def _parse_ym(s: str) -> Tuple[int, int]:
+    y, m = str(s).strip().split("-")[:2]
+    y, m = int(y), int(m)
+    if not 1 <= m <= 12: raise ValueError(f"bad month in {s!r}")
+    return y, m
+
+def _month_range(first: Tuple[int,int], last: Tuple[int,int]) -> List[Tuple[int,int]]:
+    out = []; y, m = first
+    while (y, m) <= last:
+        out.append((y, m))
+        y, m = (y+1, 1) if m == 12 else (y, m+1)
+    return out
+
+def backfill_handler(event, context):
+    """Regenerate past months: {"start": "2024-01", "end": "2024-12", "workers": 4}.
+    The deployed function reaches it through handler with {"backfill": {...}}.
+
+    Months are scanned concurrently (shared S3 clients), each writing its CSVs under
+    REPORTS_PREFIX/{y}/{mm}/. Each touched year's summary is built once afterwards from the
+    freshly computed months, then every month's HTML is rendered with it."""
+    _check_config()
+    event = event or {}
+    if not event.get("start"):
+        raise ValueError('backfill needs "start" (YYYY-MM); "end" defaults to start')
+    now = _now_utc()
+    first = _parse_ym(event["start"]); last = _parse_ym(event.get("end") or event["start"])
+    last = min(last, (now.year, now.month))
+    months = _month_range(first, last)
+    if not months:
+        raise ValueError(f"empty month range {event.get('start')}..{event.get('end')}")
+    workers = max(1, min(int(event.get("workers") or BACKFILL_WORKERS), len(months)))
+    t0 = time.monotonic()
+
+    def window(ym):
+        y, mo = ym
+        if ym == (now.year, now.month): return month_window_utc(now)
+        return _first_of_month(y, mo), _last_of_month(y, mo)
+
+    def build(ym):
+        try: return ym, build_month(ym[0], ym[1], *window(ym)), None
+        except Exception as e:
+            log(f"[warn] backfill {ym[0]}-{ym[1]:02d} failed: {type(e).__name__}: {e}")
+            return ym, None, f"{type(e).__name__}: {e}"
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        built = list(pool.map(build, months))
+    fresh = {ym: m for ym, m, _ in built if m is not None}
+    errors = {f"{ym[0]}-{ym[1]:02d}": err for ym, _, err in built if err}
+    known = {ym: s for ym, s in ((ym, _month_summary(m)) for ym, m in fresh.items()) if s}
+
+    # Year summaries, once per touched year
+    years = {}
+    for y in sorted({ym[0] for ym in fresh}):
+        through = now.month if y == now.year else 12
+        try:
+            years[y] = build_year_summary(y, through, {mo: s for (yy, mo), s in known.items() if yy == y})
+            _put_csv(REPORTS_BUCKET, f"{REPORTS_PREFIX}/{y}/uptime-year-summary.csv",
+                     years[y][2], YEAR_SUMMARY_COLS)
+        except Exception as e:
+            log(f"[warn] YTD summary {y} skipped: {type(e).__name__}")
+            years[y] = ([], [], [])
+
+    # SLO lookback months outside the range: resolved once here, not again for every month needing them
+    if not _slo_is_fixed():
+        need = sorted({p for ym in fresh for p in _slo_lookback(*ym)} - set(known))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            known.update(zip(need, pool.map(lambda p: _stored_month_summary(*p), need)))
+
+    def publish(ym):
+        y, mo = ym
+        chart, table, _ = years[y]
+        slo_val = resolve_slo(_first_of_month(y, mo), known)
+        try: return ym, publish_month(fresh[ym], slo_val, chart[:mo], table[:mo], now), None
+        except Exception as e:
+            log(f"[warn] backfill render {y}-{mo:02d} failed: {type(e).__name__}: {e}")
+            return ym, None, f"{type(e).__name__}: {e}"
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        published = list(pool.map(publish, sorted(fresh)))
+    errors.update({f"{ym[0]}-{ym[1]:02d}": err for ym, _, err in published if err})
+    errors.update({f"{ym[0]}-{ym[1]:02d}": out["pdf_error"] for ym, out, _ in published if out and out["pdf_error"]})
 
+    elapsed = time.monotonic() - t0
+    done = sum(1 for _, out, _ in published if out is not None)
+    log(f"[info] backfill {len(months)} month(s), {done} ok in {elapsed:.1f}s ({done/(elapsed/60.0) if elapsed else 0.0:.2f} months/min)")
     return {
-        "status":"ok",
+        "status": "ok" if not errors else "partial",
         "artifacts": {"bucket": ART_BUCKET, "prefix": ART_PREFIX},
         "reports": {"bucket": REPORTS_BUCKET, "prefix": REPORTS_PREFIX},
-        "result": {"bucket": REPORTS_BUCKET, "key": html_key},
-        "html": f"s3://{REPORTS_BUCKET}/{html_key}"
+        "months": {f"{ym[0]}-{ym[1]:02d}": out for ym, out, _ in published if out is not None},
+        "errors": errors,
+        "workers": workers,
+        "elapsed_s": round(elapsed, 3),
+        "months_per_min": round(done/(elapsed/60.0), 3) if elapsed else None
     }
+
+# -------------------------- Compaction ------------------------------
+def _get_artifact(key: str) -> bytes:
+    return s3.get_object(Bucket=ART_BUCKET, Key=key)["Body"].read()
+
+def compact_day(day: datetime.date, delete_originals: bool = False, force: bool = False) -> Dict[str, Any]:
+    """Roll one day of raw artifacts into DD.bundle + DD.index.json.gz (see "Bundles" above).
+    A GET failure aborts the day without writing anything; originals are only deleted after both
+    objects are written."""
+    base = _bundle_base(day)
+    index_key = f"{base}.index.json.gz"; bundle_key = f"{base}.bundle"
+    if not force:
+        try:
+            s3.head_object(Bucket=ART_BUCKET, Key=index_key)
+            return {"day": day.isoformat(), "status": "exists"}
+        except Exception:
+            pass
+
+    keys = [k for k in _list_prefix(f"{ART_PREFIX}/{day:%Y}/{day:%m}/{day:%d}/") if PAT_ANY.match(k)]
+    keys.sort(key=lambda k: artifact_type(PAT_ANY.match(k).group("file")) == "other")
+    if not keys:
+        return {"day": day.isoformat(), "status": "empty"}
+
+    entries = []; raw_bytes = 0; parsed_len = 0
+    with tempfile.TemporaryFile(dir="/tmp") as f, ThreadPoolExecutor(max_workers=COMPACT_WORKERS) as pool:
+        for i in range(0, len(keys), COMPACT_WORKERS * 16):
+            batch = keys[i:i + COMPACT_WORKERS * 16]
+            for key, body in zip(batch, pool.map(_get_artifact, batch)):
+                m = PAT_ANY.match(key); fname = m.group("file")
+                try:
+                    ok, ms = parse_artifact(fname, body)
+                except Exception:
+                    ok, ms = None, 0.0
+                blob = gzip.compress(body, mtime=0)
+                entries.append({"key": key, "t": f"{m.group('h')}:{m.group('min')}", "br": m.group("br"),
+                                "file": fname, "type": artifact_type(fname),
+                                "ok": ok, "ms": round(float(ms or 0.0), 3),
+                                "off": f.tell(), "len": len(blob), "size": len(body)})
+                f.write(blob); raw_bytes += len(body)
+                if entries[-1]["type"] != "other": parsed_len = f.tell()
+        bundle_bytes = f.tell()
+        f.seek(0)
+        s3.upload_fileobj(f, ART_BUCKET, bundle_key, ExtraArgs={"ContentType": "application/gzip"})
+
+    index = {"day": day.isoformat(), "bundle": bundle_key, "parsed_len": parsed_len, "entries": entries}
+    s3.put_object(Bucket=ART_BUCKET, Key=index_key, ContentType="application/json", ContentEncoding="gzip",
+                  Body=gzip.compress(json.dumps(index, separators=(",", ":")).encode("utf-8")))
+
+    deleted = 0
+    if delete_originals:
+        for i in range(0, len(keys), 1000):
+            s3.delete_objects(Bucket=ART_BUCKET, Delete={"Objects": [{"Key": k} for k in keys[i:i+1000]], "Quiet": True})
+            deleted += len(keys[i:i+1000])
+    log(f"[info] compacted {day}: {len(keys)} objects, {raw_bytes} -> {bundle_bytes} bytes, deleted {deleted}")
+    return {"day": day.isoformat(), "status": "compacted", "objects": len(keys), "raw_bytes": raw_bytes,
+            "bundle_bytes": bundle_bytes, "bundle": bundle_key, "index": index_key, "deleted": deleted}
+
+def compact_handler(event, context):
+    """Compact completed UTC days: {"day": "YYYY-MM-DD"} or {"start": ..., "end": ...};
+    default is yesterday. Optional "delete_originals" and "force" (rebuild existing bundles)."""
+    if not ART_BUCKET:
+        raise ValueError(f"ART_BUCKET must be set: ART_BUCKET={repr(ART_BUCKET)}")
+    event = event or {}
+    last_complete = _now_utc().date() - timedelta(days=1)
+    first = datetime.date.fromisoformat(event.get("day") or event.get("start") or last_complete.isoformat())
+    last = datetime.date.fromisoformat(event.get("day") or event.get("end") or first.isoformat())
+    last = min(last, last_complete)
+    delete = bool(event.get("delete_originals", COMPACT_DELETE_ORIGINALS))
+    force = bool(event.get("force", False))
+
+    days = []; cur = first
+    while cur <= last:
+        try:
+            days.append(compact_day(cur, delete, force))
+        except Exception as e:
+            log(f"[warn] compaction {cur} failed: {type(e).__name__}: {e}")
+            days.append({"day": cur.isoformat(), "status": "error", "error": f"{type(e).__name__}: {e}"})
+        cur += timedelta(days=1)
+    failed = any(d["status"] == "error" for d in days)
+    return {"status": "partial" if failed else "ok", "artifacts": {"bucket": ART_BUCKET, "prefix": ART_PREFIX}, "days": days}
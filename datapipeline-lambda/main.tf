@@ -38,6 +38,7 @@ data "archive_file" "zip" {
   }
 }
 
+# Monthly report; invoke with {"backfill": {"start": "2024-01", "end": "2024-12"}} to regenerate past months
 resource "aws_lambda_function" "uptime" {
   function_name    = local.fn_name
   role             = var.lambda_role_arn
@@ -73,5 +74,49 @@ resource "aws_lambda_function" "uptime" {
   }
 }
 
+# Daily compaction of raw canary artifacts into per-day bundles (same package, compact_handler)
+resource "aws_lambda_function" "compact" {
+  count            = var.enable_compaction ? 1 : 0
+  function_name    = "${local.fn_name}-compact"
+  role             = var.lambda_role_arn
+  handler          = "lambda_function.compact_handler"
+  runtime          = "python3.11"
+  filename         = data.archive_file.zip.output_path
+  source_code_hash = data.archive_file.zip.output_base64sha256
+  memory_size      = 1024
+  timeout          = 900
+  architectures    = ["x86_64"]
+
+  ephemeral_storage {
+    size = 2048
+  }
+
+  tags = {
+    Project = var.name_prefix
+    Region  = var.region
+  }
+}
+
+resource "aws_cloudwatch_event_rule" "compact_daily" {
+  count               = var.enable_compaction ? 1 : 0
+  name                = "${local.fn_name}-compact-daily"
+  schedule_expression = var.compaction_schedule
+}
+
+resource "aws_cloudwatch_event_target" "compact_daily" {
+  count = var.enable_compaction ? 1 : 0
+  rule  = aws_cloudwatch_event_rule.compact_daily[0].name
+  arn   = aws_lambda_function.compact[0].arn
+}
+
+resource "aws_lambda_permission" "compact_daily" {
+  count         = var.enable_compaction ? 1 : 0
+  statement_id  = "AllowDailyCompaction"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.compact[0].function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.compact_daily[0].arn
+}
+
 output "lambda_function_name" { value = aws_lambda_function.uptime.function_name }
 output "lambda_function_arn"  { value = aws_lambda_function.uptime.arn }
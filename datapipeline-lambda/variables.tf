@@ -83,3 +83,15 @@ variable "source_py" {
   type        = string
   default     = "lambda_generate_uptime.py"
 }
+
+variable "enable_compaction" {
+  description = "Create the daily artifact compaction Lambda and its schedule"
+  type        = bool
+  default     = true
+}
+
+variable "compaction_schedule" {
+  description = "EventBridge schedule for compact_handler (runs on the previous UTC day)"
+  type        = string
+  default     = "cron(30 0 * * ? *)"
+}
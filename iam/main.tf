@@ -117,6 +117,11 @@ data "aws_iam_policy_document" "lambda_perm" {
     actions   = ["cloudwatch:*"]
     resources = ["*"]
   }
+  statement {
+    sid       = "LambdaInvoke"
+    actions   = ["lambda:InvokeFunction"]
+    resources = ["*"]
+  }
   statement {
     sid       = "QSAll"
     actions   = ["quicksight:*"]
@@ -1,4 +1,4 @@
-import os, json, boto3, pdfkit
+import os, io, json, uuid, base64, binascii, functools, cProfile, pstats, boto3, pdfkit
 from datetime import datetime
 from botocore.exceptions import ClientError
 
@@ -12,6 +12,17 @@ BASE_PREFIX      = "uptime"
 PDF_FORMAT       = "A4"
 JS_DELAY_MS      = 5000                      # ms to let JS render
 WKHTMLTOPDF_BIN  = "/usr/bin/wkhtmltopdf"    # wkhtmltopdf path in your layer/image
+COPY_HTML_DEBUG  = False                     # True = always copy the source HTML next to the PDF (event "copy_html" overrides)
+
+# Opt-in profiling: event {"profile": true | "s3://bucket/prefix" | "/local/dir"} or env PROFILE_OUTPUT (same forms;
+# strings that are not s3:// or absolute paths are flags, so "false"/"0" stay off)
+PROFILE_OUTPUT   = os.environ.get("PROFILE_OUTPUT", "")
+PROFILE_TOP_N    = 30
+
+# Synchronous HTTP mode (function URL / API Gateway): PDF returned in the response body
+SYNC_PDF_INLINE_MAX = 4_400_000              # bytes; base64 of this stays under Lambda's 6 MB response cap
+PRESIGN_EXPIRES_S   = 900                    # larger PDFs are uploaded and answered with a 303 to a presigned URL
+ONDEMAND_PREFIX     = f"{BASE_PREFIX}/_ondemand"  # scratch keys for those uploads (expired by the s3/ lifecycle rule)
 
 # Lambda tmp-friendly defaults
 os.environ.setdefault("HOME", "/tmp")
@@ -21,6 +32,26 @@ os.environ.setdefault("FONTCONFIG_PATH", "/etc/fonts")
 s3 = boto3.client("s3")
 sts = boto3.client("sts")
 
+PDF_OPTIONS = {
+    "page-size": PDF_FORMAT,
+    "print-media-type": None,
+    "enable-local-file-access": None,
+    "encoding": "UTF-8",
+    "margin-top": "0mm",
+    "margin-right": "0mm",
+    "margin-bottom": "0mm",
+    "margin-left": "0mm",
+    "javascript-delay": str(JS_DELAY_MS),
+    # "window-status": "done",
+    # "no-stop-slow-scripts": None,
+    # "debug-javascript": None,
+    # "log-level": "warn",
+}
+
+# HTTP callers supply their own HTML: never let wkhtmltopdf read local files (e.g. /proc/self/environ)
+HTTP_PDF_OPTIONS = {k: v for k, v in PDF_OPTIONS.items() if k != "enable-local-file-access"}
+HTTP_PDF_OPTIONS["disable-local-file-access"] = None
+
 def _ym(event: dict):
     now = datetime.utcnow()
     y = str(event.get("year")  or now.year).zfill(4)
@@ -30,12 +61,188 @@ def _ym(event: dict):
 def _key(y, m, name):
     return f"{BASE_PREFIX}/{y}/{m}/{name}".lstrip("/")
 
+def _inline_html(event: dict):
+    """HTML carried in the event itself ("html" as text, or "html_b64"); None when absent.
+    Raises TypeError for a non-text "html" and ValueError/binascii.Error for bad base64."""
+    if event.get("html") is not None:
+        if not isinstance(event["html"], (str, bytes)):
+            raise TypeError("html must be a string")
+        return event["html"]
+    if event.get("html_b64"):
+        return base64.b64decode(event["html_b64"], validate=True)
+    return None
+
+def render_pdf(html, options: dict = None) -> bytes:
+    """Render HTML (str or UTF-8 bytes) to PDF bytes in memory. Raises OSError on wkhtmltopdf failure."""
+    if isinstance(html, (bytes, bytearray)):
+        html = bytes(html).decode("utf-8", errors="ignore")
+    config = pdfkit.configuration(wkhtmltopdf=WKHTMLTOPDF_BIN)
+    return pdfkit.from_string(html, False, options=PDF_OPTIONS if options is None else options, configuration=config)
+
+PROFILE_DESTS = ("s3://", "/")   # profile values that name a destination; other strings are flags
+
+def _profile_on(v) -> bool:
+    if isinstance(v, str):
+        return v.startswith(PROFILE_DESTS) or _truthy(v)
+    return bool(v)
+
+def _profile_target(event) -> str:
+    """Empty unless profiling; then the event's destination, PROFILE_OUTPUT's, or DEST_BUCKET/uptime/_profiles."""
+    flag = event.get("profile") if isinstance(event, dict) else None
+    if isinstance(flag, str) and flag.startswith(PROFILE_DESTS): return flag
+    if not (_profile_on(flag) or _profile_on(PROFILE_OUTPUT)): return ""
+    return PROFILE_OUTPUT if PROFILE_OUTPUT.startswith(PROFILE_DESTS) else f"s3://{DEST_BUCKET}/{BASE_PREFIX}/_profiles"
+
+def _write_profile(prof, target: str, name: str, top_n: int) -> str:
+    """Write <name>.prof (pstats) and <name>.txt (top-N by cumulative and own time) under target."""
+    out = io.StringIO()
+    st = pstats.Stats(prof, stream=out)
+    st.sort_stats("cumulative").print_stats(top_n)
+    st.sort_stats("tottime").print_stats(top_n)
+    tmp = f"/tmp/{name}.prof"
+    st.dump_stats(tmp)
+    if target.startswith("s3://"):
+        bucket, _, prefix = target[5:].partition("/")
+        base = f"{prefix.strip('/')}/{name}".lstrip("/")
+        s3.upload_file(tmp, bucket, f"{base}.prof")
+        s3.put_object(Bucket=bucket, Key=f"{base}.txt", Body=out.getvalue().encode("utf-8"), ContentType="text/plain; charset=utf-8")
+        os.remove(tmp)
+        return f"s3://{bucket}/{base}"
+    os.makedirs(target, exist_ok=True)
+    base = os.path.join(target, name)
+    os.replace(tmp, f"{base}.prof")
+    with open(f"{base}.txt", "w") as f: f.write(out.getvalue())
+    return base
+
+def profiled(fn):
+    """Run fn under cProfile when the event or PROFILE_OUTPUT asks for it; a plain call otherwise.
+    wkhtmltopdf runs in a child process, so its time shows up under subprocess.communicate."""
+    @functools.wraps(fn)
+    def wrapper(event, context=None):
+        target = _profile_target(event)
+        if not target:
+            return fn(event, context)
+        prof = cProfile.Profile()
+        try:
+            return prof.runcall(fn, event, context)
+        finally:
+            name = f"{fn.__name__}-{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}-{getattr(context, 'aws_request_id', 'local')}"
+            try:
+                top_n = int((event or {}).get("profile_top") or PROFILE_TOP_N)
+                print("PROFILE    :", _write_profile(prof, target, name, top_n))
+            except Exception as e:
+                print("profile write failed (non-fatal):", str(e))
+    return wrapper
+
+# ----------------------- Synchronous HTTP mode -----------------------
+def _is_http(event: dict) -> bool:
+    return "httpMethod" in event or "http" in (event.get("requestContext") or {})
+
+def _truthy(v) -> bool:
+    return str(v).strip().lower() in ("1", "true", "yes", "on") if v is not None else False
+
+def _json_response(status: int, payload: dict) -> dict:
+    return {"statusCode": status, "headers": {"Content-Type": "application/json"}, "body": json.dumps(payload)}
+
+def _http_params(event: dict) -> dict:
+    """Query string merged with the request body: a JSON object of lambda_handler fields, or raw HTML."""
+    params = dict(event.get("queryStringParameters") or {})
+    body = event.get("body")
+    if body:
+        raw = base64.b64decode(body, validate=True) if event.get("isBase64Encoded") else body.encode("utf-8")
+        ctype = {k.lower(): v for k, v in (event.get("headers") or {}).items()}.get("content-type", "")
+        if "json" in ctype or (not ctype and raw.lstrip()[:1] == b"{"):
+            parsed = json.loads(raw)
+            if not isinstance(parsed, dict):
+                raise ValueError("JSON body must be an object")
+            params.update(parsed)
+        else:
+            params["html"] = raw.decode("utf-8", errors="ignore")
+    return params
+
+def _http_key(p: dict, field: str, prefix: str, default_name: str) -> str:
+    """Caller-supplied key, only accepted inside prefix (BASE_PREFIX/{y}/{m}/); ValueError otherwise."""
+    key = p.get(field)
+    if not key:
+        return prefix + default_name
+    key = str(key)
+    if not key.startswith(prefix) or key == prefix or any(part in ("", ".", "..") for part in key[len(prefix):].split("/")):
+        raise ValueError(f"{field} must be a file under {prefix}")
+    return key
+
+def http_render(event: dict, context=None) -> dict:
+    """Render and return the PDF in the HTTP response (base64 body).
+
+    HTML comes inline (raw body, or "html"/"html_b64" in a JSON body) or by "html_key" in SRC_BUCKET.
+    Rendering never allows local file access, and html_key/pdf_key must stay under BASE_PREFIX/{y}/{m}/.
+    The PDF is written to pdf_key in DEST_BUCKET only with "upload": true. One too large for an inline
+    response is answered with a 303 to a presigned URL (Python Lambdas cannot stream responses): of
+    pdf_key when uploaded, otherwise of a scratch copy under ONDEMAND_PREFIX."""
+    try:
+        p = _http_params(event)
+    except (ValueError, TypeError, binascii.Error) as e:
+        return _json_response(400, {"error": f"bad request body: {e}"})
+    year, month = _ym(p)
+    if not (year.isdigit() and month.isdigit() and len(year) == 4 and len(month) == 2 and 1 <= int(month) <= 12):
+        return _json_response(400, {"error": "year/month must be YYYY and MM (01-12)"})
+    prefix = _key(year, month, "")
+    try:
+        html_key = _http_key(p, "html_key", prefix, "uptime-report.html")
+        pdf_key  = _http_key(p, "pdf_key", prefix, "uptime-report.pdf")
+    except ValueError as e:
+        return _json_response(400, {"error": str(e)})
+    try:
+        inline = _inline_html(p)
+    except (ValueError, TypeError, binascii.Error) as e:
+        return _json_response(400, {"error": f"bad html/html_b64: {e}"})
+    upload = _truthy(p.get("upload"))
+
+    if inline is not None:
+        html = inline
+    else:
+        try:
+            html = s3.get_object(Bucket=SRC_BUCKET, Key=html_key)["Body"].read()
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code", "")
+            return _json_response(403 if code in ("AccessDenied", "403", "Unauthorized") else 404,
+                                  {"error": f"S3 {code} for {SRC_BUCKET}/{html_key}", "detail": str(e)})
+
+    try:
+        pdf_bytes = render_pdf(html, HTTP_PDF_OPTIONS)
+    except OSError as e:
+        return _json_response(500, {"error": f"wkhtmltopdf error: {e}"})
+
+    too_big = len(pdf_bytes) > SYNC_PDF_INLINE_MAX
+    out_key = pdf_key if upload else f"{ONDEMAND_PREFIX}/{getattr(context, 'aws_request_id', None) or uuid.uuid4().hex}.pdf"
+    if upload or too_big:
+        try:
+            s3.put_object(Bucket=DEST_BUCKET, Key=out_key, Body=pdf_bytes, ContentType="application/pdf")
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code", "")
+            return _json_response(403 if code in ("AccessDenied", "403", "Unauthorized") else 500,
+                                  {"error": f"S3 {code} on put {DEST_BUCKET}/{out_key}", "detail": str(e)})
+    if too_big:
+        url = s3.generate_presigned_url("get_object", Params={"Bucket": DEST_BUCKET, "Key": out_key},
+                                        ExpiresIn=PRESIGN_EXPIRES_S)
+        return {"statusCode": 303, "headers": {"Location": url, "X-PDF-Key": out_key}, "body": ""}
+
+    headers = {"Content-Type": "application/pdf",
+               "Content-Disposition": f'inline; filename="{pdf_key.rsplit("/", 1)[-1]}"'}
+    if upload: headers["X-PDF-Key"] = pdf_key
+    return {"statusCode": 200, "headers": headers, "isBase64Encoded": True,
+            "body": base64.b64encode(pdf_bytes).decode("ascii")}
+
+@profiled
 def lambda_handler(event, context=None):
     event = event or {}
+    if _is_http(event):
+        return http_render(event, context)
     year, month = _ym(event)
 
+    inline = _inline_html(event)
     html_key = event.get("html_key") or _key(year, month, "uptime-report.html")
     pdf_key  = event.get("pdf_key")  or _key(year, month, "uptime-report.pdf")
+    copy_html = bool(event.get("copy_html", COPY_HTML_DEBUG))
 
     # Diagnostics in CloudWatch logs
     runtime_arn = getattr(context, "invoked_function_arn", "<no-context>")
@@ -46,59 +253,54 @@ def lambda_handler(event, context=None):
         print("CALLER_STS: <failed>", str(_e))
     print(f"HARDCODED_LAMBDA_ARN={LAMBDA_ARN}")
     print(f"RUNTIME_LAMBDA_ARN={runtime_arn}")
-    print(f"Read HTML  : s3://{SRC_BUCKET}/{html_key}")
+    print(f"Read HTML  : {'<inline event payload>' if inline is not None else f's3://{SRC_BUCKET}/{html_key}'}")
     print(f"Write PDF  : s3://{DEST_BUCKET}/{pdf_key}")
 
-    # 1) fetch HTML
-    try:
-        obj = s3.get_object(Bucket=SRC_BUCKET, Key=html_key)
-        html = obj["Body"].read().decode("utf-8", errors="ignore")
-    except ClientError as e:
-        code = e.response.get("Error", {}).get("Code", "")
-        status = 403 if code in ("AccessDenied", "403", "Unauthorized") else 404
-        return {
-            "statusCode": status,
-            "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({
-                "error": f"S3 {code} for {SRC_BUCKET}/{html_key}",
-                "detail": str(e),
-                "lambda_arn_hardcoded": LAMBDA_ARN,
-                "lambda_arn_runtime": runtime_arn
-            })
-        }
+    # 1) fetch HTML (skipped when the caller handed it over inline)
+    if inline is not None:
+        html = inline
+    else:
+        try:
+            obj = s3.get_object(Bucket=SRC_BUCKET, Key=html_key)
+            html = obj["Body"].read()
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code", "")
+            status = 403 if code in ("AccessDenied", "403", "Unauthorized") else 404
+            return {
+                "statusCode": status,
+                "headers": {"Content-Type": "application/json"},
+                "body": json.dumps({
+                    "error": f"S3 {code} for {SRC_BUCKET}/{html_key}",
+                    "detail": str(e),
+                    "lambda_arn_hardcoded": LAMBDA_ARN,
+                    "lambda_arn_runtime": runtime_arn
+                })
+            }
 
-    # 2) copy HTML to dest for debugging (best-effort)
-    try:
-        s3.copy_object(
-            CopySource={"Bucket": SRC_BUCKET, "Key": html_key},
-            Bucket=DEST_BUCKET,
-            Key=html_key,
-            MetadataDirective="REPLACE",
-            ContentType="text/html; charset=utf-8"
-        )
-    except ClientError as e:
-        print("copy_object failed (non-fatal):", str(e))
+    # 2) copy HTML to dest for debugging (opt-in, best-effort)
+    if copy_html:
+        try:
+            if inline is not None:
+                s3.put_object(
+                    Bucket=DEST_BUCKET,
+                    Key=html_key,
+                    Body=html.encode("utf-8") if isinstance(html, str) else html,
+                    ContentType="text/html; charset=utf-8"
+                )
+            else:
+                s3.copy_object(
+                    CopySource={"Bucket": SRC_BUCKET, "Key": html_key},
+                    Bucket=DEST_BUCKET,
+                    Key=html_key,
+                    MetadataDirective="REPLACE",
+                    ContentType="text/html; charset=utf-8"
+                )
+        except ClientError as e:
+            print("HTML debug copy failed (non-fatal):", str(e))
 
     # 3) render to PDF with wkhtmltopdf
-    config = pdfkit.configuration(wkhtmltopdf=WKHTMLTOPDF_BIN)
-    options = {
-        "page-size": PDF_FORMAT,
-        "print-media-type": None,
-        "enable-local-file-access": None,
-        "encoding": "UTF-8",
-        "margin-top": "0mm",
-        "margin-right": "0mm",
-        "margin-bottom": "0mm",
-        "margin-left": "0mm",
-        "javascript-delay": str(JS_DELAY_MS),
-        # "window-status": "done",
-        # "no-stop-slow-scripts": None,
-        # "debug-javascript": None,
-        # "log-level": "warn",
-    }
-
     try:
-        pdf_bytes = pdfkit.from_string(html, False, options=options, configuration=config)
+        pdf_bytes = render_pdf(html)
     except OSError as e:
         return {
             "statusCode": 500,
@@ -135,8 +337,9 @@ def lambda_handler(event, context=None):
             "src_bucket": SRC_BUCKET,
             "dest_bucket": DEST_BUCKET,
             "prefix": f"{BASE_PREFIX}/{year}/{month}/",
-            "html_key": html_key,
-            "dest_html_key": html_key,
+            "html_key": None if inline is not None else html_key,
+            "html_source": "inline" if inline is not None else "s3",
+            "dest_html_key": html_key if copy_html else None,
             "dest_pdf_key": pdf_key,
             "js_delay_ms": JS_DELAY_MS,
             "format": PDF_FORMAT
@@ -0,0 +1,265 @@
+"""Local concurrency load test for the html->pdf Lambda (lambda_function.lambda_handler).
+
+Calls lambda_handler from a thread pool against an in-memory S3 stand-in, using a
+corpus of report HTMLs (a directory of *.html, or reports generated with the data
+pipeline's render_html for 1/7/31 days of minute data). Needs wkhtmltopdf, boto3
+and pdfkit installed locally; no AWS calls are made.
+
+Records per run: p50/p95/p99 latency, peak RSS (this process and wkhtmltopdf
+children), /tmp high-water mark and error rate, written as JSON for comparing runs.
+
+  python loadtest/pdf_load.py --concurrency 8 --requests 48 --out run-c8.json
+  python loadtest/pdf_load.py --corpus ./reports --handoff inline --js-delay-ms 0
+"""
+import os, sys, io, json, time, math, argparse, threading, tempfile, contextlib, resource, importlib.util
+import datetime
+from datetime import timezone, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+sys.path.insert(0, ROOT)
+
+from botocore.exceptions import ClientError
+import lambda_function as lf
+
+# ------------------------- S3 stand-in -------------------------------
+class LocalS3:
+    """Thread-safe dict-backed subset of the S3 client used by lambda_handler."""
+    def __init__(self):
+        self.objects = {}
+        self.lock = threading.Lock()
+        self.calls = {"get_object": 0, "put_object": 0, "copy_object": 0}
+
+    def _count(self, op):
+        with self.lock: self.calls[op] += 1
+
+    def _missing(self, op, bucket, key):
+        return ClientError({"Error": {"Code": "NoSuchKey", "Message": f"{bucket}/{key}"}}, op)
+
+    def get_object(self, Bucket, Key, **_):
+        self._count("get_object")
+        with self.lock: body = self.objects.get((Bucket, Key))
+        if body is None: raise self._missing("GetObject", Bucket, Key)
+        return {"Body": io.BytesIO(body), "ContentLength": len(body)}
+
+    def put_object(self, Bucket, Key, Body, **_):
+        self._count("put_object")
+        body = Body.encode("utf-8") if isinstance(Body, str) else bytes(Body)
+        with self.lock: self.objects[(Bucket, Key)] = body
+        return {}
+
+    def copy_object(self, CopySource, Bucket, Key, **_):
+        self._count("copy_object")
+        with self.lock: body = self.objects.get((CopySource["Bucket"], CopySource["Key"]))
+        if body is None: raise self._missing("CopyObject", CopySource["Bucket"], CopySource["Key"])
+        with self.lock: self.objects[(Bucket, Key)] = body
+        return {}
+
+class LocalSTS:
+    def get_caller_identity(self):
+        return {"Account": "000000000000", "Arn": "arn:aws:sts::000000000000:assumed-role/loadtest/local"}
+
+# --------------------------- Corpus ----------------------------------
+def _load_pipeline():
+    path = os.path.join(ROOT, "datapipeline-lambda", "lambda_generate_uptime.py")
+    spec = importlib.util.spec_from_file_location("lambda_generate_uptime", path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+def synthetic_report(days: int) -> bytes:
+    """A report HTML shaped like month-end output: `days` days of minute data, ~0.1% failed minutes."""
+    gen = _load_pipeline()
+    start = datetime.datetime(2025, 1, 1, tzinfo=timezone.utc)
+    mins = [start + timedelta(minutes=i) for i in range(days * 24 * 60)]
+    minute_rows = [{"ts": t.strftime("%Y-%m-%d %H:%M"), "avail": 0.0 if i % 997 == 0 else 100.0} for i, t in enumerate(mins)]
+    hour_rows = [{"hour": (start + timedelta(hours=h)).strftime("%Y-%m-%d %H:%M"), "avail": 99.9} for h in range(days * 24)]
+    mc_rows = [{"day": (start + timedelta(days=d)).strftime("%Y-%m-%d"), "avail": 99.9} for d in range(31)]
+    year_rows = [{"month": "2025-01", "availability": 99.9}]
+    table_rows = [{"label": "January 2025", "availability": 99.9}]
+    meta = dict(company=gen.COMPANY, client=gen.CLIENT, service=gen.SERVICE, year="2025", month_name="January",
+                slo=99.9, availability=99.9, downtime_min=0, incidents=0)
+    html = gen.render_html(meta, minute_rows, hour_rows, mc_rows, [{"name": "loadtest", "pct": 99.9}],
+                           year_rows, table_rows, [], generated_at="2025-01-31 23:59 UTC")
+    return html.encode("utf-8")
+
+def load_corpus(corpus_dir, days):
+    if corpus_dir:
+        out = []
+        for name in sorted(os.listdir(corpus_dir)):
+            if name.lower().endswith(".html"):
+                with open(os.path.join(corpus_dir, name), "rb") as f:
+                    out.append((name, f.read()))
+        if not out: raise SystemExit(f"no *.html files in {corpus_dir}")
+        return out
+    return [(f"synthetic-{d}d.html", synthetic_report(d)) for d in days]
+
+# --------------------------- Sampling --------------------------------
+def _dir_bytes(path: str) -> int:
+    total = 0
+    try:
+        with os.scandir(path) as it:
+            for e in it:
+                try:
+                    if e.is_dir(follow_symlinks=False): total += _dir_bytes(e.path)
+                    else: total += e.stat(follow_symlinks=False).st_size
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return total
+
+def _rss_kb(pid) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"): return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return 0
+
+def _child_pids(pid: int):
+    """Direct children of every thread of pid (wkhtmltopdf is spawned from pool worker threads,
+    so /proc/<pid>/task/<pid>/children alone would miss them)."""
+    kids = set()
+    try:
+        tids = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        return []
+    for tid in tids:
+        try:
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                kids.update(int(p) for p in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return sorted(kids)
+
+class Sampler(threading.Thread):
+    """Polls RSS (self + children of any thread) and the temp dir size; keeps the high-water marks."""
+    def __init__(self, tmp_dir: str, interval: float):
+        super().__init__(daemon=True)
+        self.tmp_dir = tmp_dir; self.interval = interval
+        self.tmp_base = _dir_bytes(tmp_dir)
+        self.peak_tmp = 0; self.peak_rss_total_kb = 0; self.peak_children = 0
+        self.stop = threading.Event()
+
+    def run(self):
+        me = os.getpid()
+        while not self.stop.is_set():
+            kids = _child_pids(me)
+            rss = _rss_kb(me) + sum(_rss_kb(k) for k in kids)
+            self.peak_rss_total_kb = max(self.peak_rss_total_kb, rss)
+            self.peak_children = max(self.peak_children, len(kids))
+            self.peak_tmp = max(self.peak_tmp, _dir_bytes(self.tmp_dir) - self.tmp_base)
+            self.stop.wait(self.interval)
+
+def percentile(sorted_vals, q: float):
+    if not sorted_vals: return None
+    k = max(0, math.ceil(q / 100.0 * len(sorted_vals)) - 1)
+    return sorted_vals[k]
+
+def _latency_summary(lat_ms):
+    v = sorted(lat_ms)
+    return {"p50": percentile(v, 50), "p95": percentile(v, 95), "p99": percentile(v, 99),
+            "max": v[-1] if v else None, "mean": (sum(v) / len(v)) if v else None}
+
+# ----------------------------- Run -----------------------------------
+def run(args) -> dict:
+    corpus = load_corpus(args.corpus, args.days)
+    store = LocalS3(); lf.s3 = store; lf.sts = LocalSTS()
+    if args.wkhtmltopdf: lf.WKHTMLTOPDF_BIN = args.wkhtmltopdf
+    if args.js_delay_ms is not None: lf.PDF_OPTIONS["javascript-delay"] = str(args.js_delay_ms)
+
+    events = []
+    for i in range(args.requests):
+        name, html = corpus[i % len(corpus)]
+        html_key = f"loadtest/{i:05d}/{name}"
+        ev = {"html_key": html_key, "pdf_key": f"loadtest/{i:05d}/{name}.pdf", "copy_html": args.copy_html}
+        if args.handoff == "inline":
+            ev["html"] = html.decode("utf-8")
+        else:
+            store.put_object(Bucket=lf.SRC_BUCKET, Key=html_key, Body=html)
+        events.append((name, len(html), ev))
+    store.calls = dict.fromkeys(store.calls, 0)
+
+    def one(item):
+        name, size, ev = item
+        t0 = time.perf_counter()
+        try:
+            resp = lf.lambda_handler(ev, None)
+            status = resp.get("statusCode"); err = None if status == 200 else resp.get("body")
+        except Exception as e:
+            status = None; err = f"{type(e).__name__}: {e}"
+        return {"doc": name, "html_bytes": size, "latency_ms": (time.perf_counter() - t0) * 1000.0,
+                "status": status, "error": err}
+
+    sampler = Sampler(tempfile.gettempdir(), args.sample_interval)
+    sampler.start()
+    t0 = time.perf_counter()
+    sink = open(os.devnull, "w") if not args.verbose else None
+    with (contextlib.redirect_stdout(sink) if sink else contextlib.nullcontext()):
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(one, events))
+    wall = time.perf_counter() - t0
+    sampler.stop.set(); sampler.join()
+    if sink: sink.close()
+
+    errors = [r for r in results if r["error"] is not None]
+    by_doc = {}
+    for r in results: by_doc.setdefault(r["doc"], []).append(r)
+    pdf_bytes = [len(v) for (b, k), v in store.objects.items() if b == lf.DEST_BUCKET and k.endswith(".pdf")]
+
+    return {
+        "config": {"concurrency": args.concurrency, "requests": args.requests, "handoff": args.handoff,
+                   "copy_html": args.copy_html, "js_delay_ms": lf.PDF_OPTIONS["javascript-delay"],
+                   "wkhtmltopdf": lf.WKHTMLTOPDF_BIN, "corpus": [{"doc": n, "html_bytes": len(h)} for n, h in corpus],
+                   "cpu_count": os.cpu_count(), "started_utc": datetime.datetime.now(timezone.utc).isoformat()},
+        "summary": {
+            "wall_s": wall,
+            "throughput_rps": (len(results) / wall) if wall else None,
+            "error_rate": len(errors) / len(results) if results else 0.0,
+            "errors": len(errors),
+            "latency_ms": _latency_summary([r["latency_ms"] for r in results]),
+            "peak_rss_self_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "peak_rss_child_max_kb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+            "peak_rss_sampled_total_kb": sampler.peak_rss_total_kb,
+            "peak_concurrent_children": sampler.peak_children,
+            "tmp_high_water_bytes": sampler.peak_tmp,
+            "pdf_bytes_avg": (sum(pdf_bytes) / len(pdf_bytes)) if pdf_bytes else None,
+            "s3_calls": store.calls,
+        },
+        "by_doc": {d: {"html_bytes": rs[0]["html_bytes"], "n": len(rs),
+                       "errors": sum(1 for r in rs if r["error"] is not None),
+                       "latency_ms": _latency_summary([r["latency_ms"] for r in rs])} for d, rs in by_doc.items()},
+        "first_errors": [{"doc": r["doc"], "status": r["status"], "error": r["error"]} for r in errors[:10]],
+    }
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--requests", type=int, default=24, help="total invocations (corpus is cycled)")
+    ap.add_argument("--corpus", help="directory of report *.html files (default: generated reports)")
+    ap.add_argument("--days", type=int, nargs="+", default=[1, 7, 31], help="sizes of generated reports, in days of minute data")
+    ap.add_argument("--handoff", choices=["s3", "inline"], default="s3", help="pass HTML by key (S3 stand-in) or inline in the event")
+    ap.add_argument("--copy-html", action="store_true", help="enable the debug HTML copy on every invocation")
+    ap.add_argument("--js-delay-ms", type=int, help="override JS_DELAY_MS for the run")
+    ap.add_argument("--wkhtmltopdf", help="override WKHTMLTOPDF_BIN")
+    ap.add_argument("--sample-interval", type=float, default=0.05, help="seconds between RSS//tmp samples")
+    ap.add_argument("--out", help="write JSON results here (default: stdout)")
+    ap.add_argument("--verbose", action="store_true", help="keep lambda_handler's log output")
+    args = ap.parse_args(argv)
+
+    res = run(args)
+    text = json.dumps(res, indent=2)
+    if args.out:
+        with open(args.out, "w") as f: f.write(text + "\n")
+        s = res["summary"]
+        print(f"{args.requests} req @ c={args.concurrency}: p50={s['latency_ms']['p50']:.0f}ms "
+              f"p95={s['latency_ms']['p95']:.0f}ms p99={s['latency_ms']['p99']:.0f}ms "
+              f"errors={s['error_rate']:.1%} -> {args.out}")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
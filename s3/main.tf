@@ -114,6 +114,18 @@ resource "aws_s3_bucket_server_side_encryption_configuration" "report" {
   }
 }
 
+# On-demand PDFs from the HTTP render path (uptime/_ondemand/) are scratch copies behind presigned URLs
+resource "aws_s3_bucket_lifecycle_configuration" "report" {
+  bucket = aws_s3_bucket.report.id
+  rule {
+    id     = "expire-ondemand-pdfs"
+    status = "Enabled"
+    filter { prefix = "uptime/_ondemand/" }
+    expiration { days = var.ondemand_expiry_days }
+    noncurrent_version_expiration { noncurrent_days = 1 }
+  }
+}
+
 # ---------------------------
 # Outputs
 # ---------------------------
@@ -26,6 +26,12 @@ variable "report_bucket_name" {
   type        = string
 }
 
+variable "ondemand_expiry_days" {
+  description = "Days to keep on-demand PDFs written under uptime/_ondemand/ in the report bucket"
+  type        = number
+  default     = 1
+}
+
 variable "force_destroy" {
   description = "If true, allows Terraform to destroy non-empty buckets (dev only)"
   type        = bool